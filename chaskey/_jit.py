@@ -0,0 +1,161 @@
+"""Numba compiled Chaskey-LTS CTR kernel.
+
+Importing this module raises ImportError when numba is not installed, in
+which case the numpy or pure python implementation is used instead.
+"""
+
+import numba
+import numpy as np
+
+MASK32 = 0xffffffff
+
+_WORD = numba.int64
+_BYTES = numba.types.Array(numba.uint8, 1, 'C')
+_BYTES_RO = numba.types.Array(numba.uint8, 1, 'C', readonly=True)
+
+
+@numba.njit(numba.types.UniTuple(_WORD, 4)(_WORD, _WORD, _WORD, _WORD,
+                                           _WORD, _WORD, _WORD, _WORD),
+            cache=True)
+def _block_enc(v0, v1, v2, v3, k0, k1, k2, k3):
+    # Words are carried as int64 and masked, so the arithmetic does not
+    # depend on numba's integer promotion rules for uint32
+    v0 ^= k0
+    v1 ^= k1
+    v2 ^= k2
+    v3 ^= k3
+
+    for _ in range(16):
+        v0 = (v0 + v1) & MASK32
+        v1 = ((v1 << 5) | (v1 >> 27)) & MASK32
+        v1 ^= v0
+        v0 = ((v0 << 16) | (v0 >> 16)) & MASK32
+        v2 = (v2 + v3) & MASK32
+        v3 = ((v3 << 8) | (v3 >> 24)) & MASK32
+        v3 ^= v2
+        v0 = (v0 + v3) & MASK32
+        v3 = ((v3 << 13) | (v3 >> 19)) & MASK32
+        v3 ^= v0
+        v2 = (v2 + v1) & MASK32
+        v1 = ((v1 << 7) | (v1 >> 25)) & MASK32
+        v1 ^= v2
+        v2 = ((v2 << 16) | (v2 >> 16)) & MASK32
+
+    return v0 ^ k0, v1 ^ k1, v2 ^ k2, v3 ^ k3
+
+
+@numba.njit(_WORD(_WORD), cache=True)
+def _bswap32(x):
+    return (
+        ((x & 0xff) << 24) |
+        ((x & 0xff00) << 8) |
+        ((x >> 8) & 0xff00) |
+        ((x >> 24) & 0xff)
+    )
+
+
+@numba.njit(numba.types.UniTuple(_WORD, 4)(numba.intp, _WORD, _WORD, _WORD,
+                                           _WORD, _WORD, _WORD, _WORD, _WORD),
+            cache=True)
+def _keystream(b, k0, k1, k2, k3, c0, c1, c2, c3):
+    # c0..c3 are the big-endian 32-bit limbs of the 128-bit counter, to
+    # which the block index is added so blocks can be processed in any order
+    t = c3 + b
+    n3 = t & MASK32
+    t = c2 + (t >> 32)
+    n2 = t & MASK32
+    t = c1 + (t >> 32)
+    n1 = t & MASK32
+    n0 = (c0 + (t >> 32)) & MASK32
+
+    return _block_enc(_bswap32(n0), _bswap32(n1), _bswap32(n2), _bswap32(n3),
+                      k0, k1, k2, k3)
+
+
+@numba.njit(numba.void(_BYTES_RO, _BYTES, _WORD, _WORD, _WORD, _WORD,
+                       _WORD, _WORD, _WORD, _WORD),
+            cache=True)
+def _ctr_tail(data, out, k0, k1, k2, k3, c0, c1, c2, c3):
+    # Only the trailing partial block is XORed a byte at a time
+    i = data.shape[0] & ~15
+    w0, w1, w2, w3 = _keystream(i // 16, k0, k1, k2, k3, c0, c1, c2, c3)
+    for j in range(i, data.shape[0]):
+        x = j - i
+        if x < 4:
+            w = w0
+        elif x < 8:
+            w = w1
+        elif x < 12:
+            w = w2
+        else:
+            w = w3
+        out[j] = data[j] ^ ((w >> (8 * (x & 3))) & 0xff)
+
+
+# Whole blocks are XORed a word at a time through uint32 views of the
+# buffers, which match the little-endian keystream words on every host numba
+# supports. The views need not be 4-byte aligned.
+_CTR_SIG = numba.void(
+    _BYTES_RO, _BYTES,
+    numba.types.Array(numba.uint32, 1, 'C', readonly=True, aligned=False),
+    numba.types.Array(numba.uint32, 1, 'C', aligned=False),
+    _WORD, _WORD, _WORD, _WORD, _WORD, _WORD, _WORD, _WORD)
+
+
+@numba.njit(_CTR_SIG, cache=True, nogil=True)
+def _ctr_xor(data, out, data32, out32, k0, k1, k2, k3, c0, c1, c2, c3):
+    for b in range(data32.shape[0] // 4):
+        w0, w1, w2, w3 = _keystream(b, k0, k1, k2, k3, c0, c1, c2, c3)
+        j = b * 4
+        out32[j] = data32[j] ^ w0
+        out32[j + 1] = data32[j + 1] ^ w1
+        out32[j + 2] = data32[j + 2] ^ w2
+        out32[j + 3] = data32[j + 3] ^ w3
+    if data.shape[0] & 15:
+        _ctr_tail(data, out, k0, k1, k2, k3, c0, c1, c2, c3)
+
+
+@numba.njit(_CTR_SIG, cache=True, nogil=True, parallel=True)
+def _ctr_xor_parallel(data, out, data32, out32,
+                      k0, k1, k2, k3, c0, c1, c2, c3):
+    # CTR blocks are independent of each other, so spread them over threads
+    for b in numba.prange(data32.shape[0] // 4):
+        w0, w1, w2, w3 = _keystream(b, k0, k1, k2, k3, c0, c1, c2, c3)
+        j = b * 4
+        out32[j] = data32[j] ^ w0
+        out32[j + 1] = data32[j + 1] ^ w1
+        out32[j + 2] = data32[j + 2] ^ w2
+        out32[j + 3] = data32[j + 3] ^ w3
+    if data.shape[0] & 15:
+        _ctr_tail(data, out, k0, k1, k2, k3, c0, c1, c2, c3)
+
+
+# Below this many bytes the thread startup outweighs the parallel speedup
+PARALLEL_THRESHOLD = 64 * 1024
+
+
+def chaskey_ctr(data: bytes, key_words: tuple, counter: int) -> bytearray:
+    """Encrypt or decrypt data in CTR mode.
+
+    Args:
+        data (bytes): Data to process
+        key_words (tuple): The four little-endian key words
+        counter (int): Initial counter value
+
+    Returns:
+        bytearray: Processed data buffer
+    """
+    o = bytearray(len(data))
+    if not o:
+        return o
+    k0, k1, k2, k3 = key_words
+    src = np.frombuffer(data, dtype=np.uint8)
+    src.flags.writeable = False
+    dst = np.frombuffer(o, dtype=np.uint8)
+    full = len(o) & ~15
+    ctr_xor = _ctr_xor_parallel if len(o) >= PARALLEL_THRESHOLD else _ctr_xor
+    ctr_xor(src, dst, src[:full].view(np.uint32), dst[:full].view(np.uint32),
+            k0, k1, k2, k3,
+            (counter >> 96) & MASK32, (counter >> 64) & MASK32,
+            (counter >> 32) & MASK32, counter & MASK32)
+    return o
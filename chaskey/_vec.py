@@ -0,0 +1,76 @@
+"""NumPy vectorized Chaskey-LTS CTR implementation.
+
+Importing this module raises ImportError when numpy is not installed, in
+which case the pure python implementation is used instead.
+"""
+
+import numpy as np
+
+MASK32 = 0xffffffff
+
+
+def _keystream(nblocks: int, key_words: tuple, counter: int) -> np.ndarray:
+    # Lay out the counters as big-endian 32-bit limbs, one row per block,
+    # carrying the block index through the limbs
+    t = np.arange(nblocks, dtype=np.uint64) + np.uint64(counter & MASK32)
+    ctr = np.empty((nblocks, 4), dtype='>u4')
+    ctr[:, 3] = t & np.uint64(MASK32)
+    t = (t >> np.uint64(32)) + np.uint64((counter >> 32) & MASK32)
+    ctr[:, 2] = t & np.uint64(MASK32)
+    t = (t >> np.uint64(32)) + np.uint64((counter >> 64) & MASK32)
+    ctr[:, 1] = t & np.uint64(MASK32)
+    t = (t >> np.uint64(32)) + np.uint64((counter >> 96) & MASK32)
+    ctr[:, 0] = t & np.uint64(MASK32)
+
+    # Reinterpret the counter bytes as the little-endian block words, so
+    # that each vN holds word N of every block
+    words = ctr.view('<u4').astype(np.uint32)
+    k0, k1, k2, k3 = (np.uint32(k) for k in key_words)
+    v0 = words[:, 0] ^ k0
+    v1 = words[:, 1] ^ k1
+    v2 = words[:, 2] ^ k2
+    v3 = words[:, 3] ^ k3
+
+    # uint32 arithmetic wraps on its own, so no masking is needed
+    for _ in range(16):
+        v0 += v1
+        v1 = (v1 << 5) | (v1 >> 27)
+        v1 ^= v0
+        v0 = (v0 << 16) | (v0 >> 16)
+        v2 += v3
+        v3 = (v3 << 8) | (v3 >> 24)
+        v3 ^= v2
+        v0 += v3
+        v3 = (v3 << 13) | (v3 >> 19)
+        v3 ^= v0
+        v2 += v1
+        v1 = (v1 << 7) | (v1 >> 25)
+        v1 ^= v2
+        v2 = (v2 << 16) | (v2 >> 16)
+
+    ks = np.empty((nblocks, 4), dtype='<u4')
+    ks[:, 0] = v0 ^ k0
+    ks[:, 1] = v1 ^ k1
+    ks[:, 2] = v2 ^ k2
+    ks[:, 3] = v3 ^ k3
+    return ks.view(np.uint8).reshape(-1)
+
+
+def chaskey_ctr(data: bytes, key_words: tuple, counter: int) -> bytearray:
+    """Encrypt or decrypt data in CTR mode.
+
+    Args:
+        data (bytes): Data to process
+        key_words (tuple): The four little-endian key words
+        counter (int): Initial counter value
+
+    Returns:
+        bytearray: Processed data buffer
+    """
+    o = bytearray(len(data))
+    if not o:
+        return o
+    ks = _keystream((len(o) + 15) // 16, key_words, counter)
+    np.bitwise_xor(np.frombuffer(data, dtype=np.uint8), ks[:len(o)],
+                   out=np.frombuffer(o, dtype=np.uint8))
+    return o
@@ -1,10 +1,121 @@
-"""Pure python Chaskey-LTS cipher implementation."""
+"""Chaskey-LTS cipher with a native CTR backend and pure python fallbacks."""
 
+import importlib
 import struct
+import textwrap
+
+try:
+    from . import _native
+except ImportError:
+    _native = None
+
+# The numba and numpy backends are slow to import, so they are only loaded
+# when CTR mode first needs them, see _load_backend()
+_UNLOADED = object()
+_jit = _UNLOADED
+_vec = _UNLOADED
+
+# Below this many bytes the numpy per-call overhead outweighs its speedup
+_VECTOR_THRESHOLD = 1024
+
+MASK32 = 0xffffffff
+
+# Chaskey operates on four little-endian 32-bit words per block
+_BLOCK = struct.Struct('<IIII')
+
+# Chaskey-LTS permutation round and its inverse, over the four state words
+_ROUND_ENC = """\
+v0 = (v0 + v1) & MASK32
+v1 = ((v1 << 5) | (v1 >> 27)) & MASK32
+v1 ^= v0
+v0 = ((v0 << 16) | (v0 >> 16)) & MASK32
+v2 = (v2 + v3) & MASK32
+v3 = ((v3 << 8) | (v3 >> 24)) & MASK32
+v3 ^= v2
+v0 = (v0 + v3) & MASK32
+v3 = ((v3 << 13) | (v3 >> 19)) & MASK32
+v3 ^= v0
+v2 = (v2 + v1) & MASK32
+v1 = ((v1 << 7) | (v1 >> 25)) & MASK32
+v1 ^= v2
+v2 = ((v2 << 16) | (v2 >> 16)) & MASK32
+"""
+
+_ROUND_DEC = """\
+v2 = ((v2 >> 16) | (v2 << 16)) & MASK32
+v1 ^= v2
+v1 = ((v1 >> 7) | (v1 << 25)) & MASK32
+v2 = (v2 - v1) & MASK32
+v3 ^= v0
+v3 = ((v3 >> 13) | (v3 << 19)) & MASK32
+v0 = (v0 - v3) & MASK32
+v3 ^= v2
+v3 = ((v3 >> 8) | (v3 << 24)) & MASK32
+v2 = (v2 - v3) & MASK32
+v0 = ((v0 >> 16) | (v0 << 16)) & MASK32
+v1 ^= v0
+v1 = ((v1 >> 5) | (v1 << 27)) & MASK32
+v0 = (v0 - v1) & MASK32
+"""
+
+_ROUNDS = 16
+
+
+def _unroll_rounds(name: str, round_src: str):
+    """Build a function applying all of the rounds to the state words.
+
+    The round count is fixed, so the round body is emitted _ROUNDS times as
+    straight-line code with the mask folded in as a literal, leaving nothing
+    but local variable and constant operations per block. The function takes
+    the four state words and four key words and returns the four output
+    words, including the key whitening on either side.
+    """
+    body = round_src.replace('MASK32', hex(MASK32))
+    src = (
+        'def {}(v0, v1, v2, v3, k0, k1, k2, k3):\n'
+        '    v0 ^= k0\n'
+        '    v1 ^= k1\n'
+        '    v2 ^= k2\n'
+        '    v3 ^= k3\n'
+        '{}'
+        '    return v0 ^ k0, v1 ^ k1, v2 ^ k2, v3 ^ k3\n'
+    ).format(name, textwrap.indent(body, '    ') * _ROUNDS)
+    ns = {}
+    exec(compile(src, '<chaskey {}>'.format(name), 'exec'), {}, ns)
+    return ns[name]
+
+
+_chaskey_block_enc_unrolled = _unroll_rounds('_chaskey_block_enc_unrolled',
+                                             _ROUND_ENC)
+_chaskey_block_dec_unrolled = _unroll_rounds('_chaskey_block_dec_unrolled',
+                                             _ROUND_DEC)
+
+
+def _load_backend(name: str):
+    """Import an optional backend module on first use.
+
+    Returns the module, or None when its dependencies are not installed.
+    """
+    module = globals()[name]
+    if module is _UNLOADED:
+        try:
+            module = importlib.import_module('.' + name, __package__)
+        except ImportError:
+            module = None
+        globals()[name] = module
+    return module
 
 
 class Chaskey():
-    """Pure python Chaskey-LTS cipher implementation."""
+    """Chaskey-LTS cipher implementation.
+
+    CTR mode runs in the native extension when it was built, and otherwise
+    falls back to numba, numpy or pure python depending on what is
+    installed; all of them produce identical output.
+
+    The native and numba CTR kernels release the GIL, so encryption can run
+    in parallel from multiple threads.
+    """
 
     @staticmethod
     def _rol(n, rot, width):
@@ -52,8 +163,11 @@ class Chaskey():
 
         Notes: Only CTR mode is currently operational
         """
+        if len(key) != 16:
+            raise ValueError('Error: key must be 16 bytes')
         self.mode = mode
         self.key = key
+        self._key_words = _BLOCK.unpack(key)
         if self.mode.lower() == 'ctr':
             # Handle counter mode
             if len(mode_args) < 1:
@@ -64,56 +178,28 @@ class Chaskey():
             ):
                 raise ValueError('Error: CTR mode nonce must be a ' +
                                  'bytes-like type')
+            if len(mode_args[0]) != 16:
+                raise ValueError('Error: CTR mode nonce must be 16 bytes')
             self.counter = mode_args[0]
         else:
             raise ValueError("Error: unsupported mode")
 
     def _chaskey_block(self, enc: bool, buf: bytes) -> bytes:
-        if len(self.key) < 16 or len(buf) < 16:
+        if enc:
+            return self._chaskey_block_enc(buf)
+        return self._chaskey_block_dec(buf)
+
+    def _chaskey_block_enc(self, buf: bytes) -> bytes:
+        if len(buf) < 16:
             return 0
+        return _BLOCK.pack(*_chaskey_block_enc_unrolled(*_BLOCK.unpack(buf),
+                                                        *self._key_words))
 
-        v = list(struct.unpack('IIII', buf))
-        k = list(struct.unpack('IIII', self.key))
-
-        for x in range(0, 4):
-            v[x] ^= k[x]
-
-        for x in range(0, 16):
-            if enc is True:
-                v[0] = (v[0] + v[1]) & 0xffffffff
-                v[1] = self._rol(v[1], 5, 32)
-                v[1] ^= v[0]
-                v[0] = self._rol(v[0], 16, 32)
-                v[2] = (v[2] + v[3]) & 0xffffffff
-                v[3] = self._rol(v[3], 8, 32)
-                v[3] ^= v[2]
-                v[0] = (v[0] + v[3]) & 0xffffffff
-                v[3] = self._rol(v[3], 13, 32)
-                v[3] ^= v[0]
-                v[2] = (v[2] + v[1]) & 0xffffffff
-                v[1] = self._rol(v[1], 7, 32)
-                v[1] ^= v[2]
-                v[2] = self._rol(v[2], 16, 32)
-            else:
-                v[2] = self._ror(v[2], 16, 32)
-                v[1] ^= v[2]
-                v[1] = self._ror(v[1], 7, 32)
-                v[2] = (v[2] - v[1]) & 0xffffffff
-                v[3] ^= v[0]
-                v[3] = self._ror(v[3], 13, 32)
-                v[0] = (v[0] - v[3]) & 0xffffffff
-                v[3] ^= v[2]
-                v[3] = self._ror(v[3], 8, 32)
-                v[2] = (v[2] - v[3]) & 0xffffffff
-                v[0] = self._ror(v[0], 16, 32)
-                v[1] ^= v[0]
-                v[1] = self._ror(v[1], 5, 32)
-                v[0] = (v[0] - v[1]) & 0xffffffff
-
-        for x in range(0, 4):
-            v[x] ^= k[x]
-
-        return struct.pack('IIII', *v)
+    def _chaskey_block_dec(self, buf: bytes) -> bytes:
+        if len(buf) < 16:
+            return 0
+        return _BLOCK.pack(*_chaskey_block_dec_unrolled(*_BLOCK.unpack(buf),
+                                                        *self._key_words))
 
     def _chaskey_pad(buf: bytes) -> bytes:
         # Pad buffer to the block length
@@ -125,29 +211,54 @@ class Chaskey():
         return buf
 
     def _chaskey_ctr(self, data: bytes) -> bytes:
-        o = bytearray()
-        i = 0
-        lenRemaining = len(data)
+        if _native is not None:
+            return _native.chaskey_ctr(data, self.key, self.counter)
+        counter = int.from_bytes(self.counter, 'big')
+        jit = _load_backend('_jit')
+        if jit is not None:
+            return jit.chaskey_ctr(data, self._key_words, counter)
+        if len(data) >= _VECTOR_THRESHOLD:
+            vec = _load_backend('_vec')
+            if vec is not None:
+                return vec.chaskey_ctr(data, self._key_words, counter)
 
-        counter = self.counter
-        # Encrypt buffer
-        while lenRemaining:
-            k = self._chaskey_block(True, counter)
+        o = bytearray(len(data))
+        lenRemaining = len(data) % 16
+        lenFull = len(data) - lenRemaining
 
-            lenBlock = 16
-            if lenRemaining < 16:
-                lenBlock = lenRemaining
+        # Hoist attribute and global lookups out of the per-block loop
+        permute = _chaskey_block_enc_unrolled
+        unpack = _BLOCK.unpack
+        pack_into = _BLOCK.pack_into
+        keyWords = self._key_words
+        from_bytes = int.from_bytes
+        to_bytes = int.to_bytes
+        k = bytearray(16)
+        ctr = bytearray(self.counter)
+        ctrBytes = range(15, -1, -1)
 
-            for x in range(0, lenBlock):
-                o.append(data[i] ^ k[x])
-                i += 1
+        # Encrypt whole blocks, XORing each as a single integer
+        for i in range(0, lenFull, 16):
+            pack_into(k, 0, *permute(*unpack(ctr), *keyWords))
+            end = i + 16
+            x = from_bytes(data[i:end], 'big') ^ from_bytes(k, 'big')
+            o[i:end] = to_bytes(x, 16, 'big')
 
-            lenRemaining -= lenBlock
+            # Increment the big-endian counter in place, usually touching
+            # only its last byte
+            for j in ctrBytes:
+                ctr[j] = (ctr[j] + 1) & 0xff
+                if ctr[j]:
+                    break
 
-            # update counter
-            c = int.from_bytes(counter, 'big')
-            c += 1
-            counter = c.to_bytes(16, 'big')
+        # Encrypt the trailing partial block with the leading keystream bytes
+        if lenRemaining:
+            pack_into(k, 0, *permute(*unpack(ctr), *keyWords))
+            x = (
+                from_bytes(data[lenFull:], 'big') ^
+                (from_bytes(k, 'big') >> (8 * (16 - lenRemaining)))
+            )
+            o[lenFull:] = to_bytes(x, lenRemaining, 'big')
 
         return o
 
@@ -1,8 +1,12 @@
 # flake8: noqa
 
-from setuptools import setup
+from setuptools import Extension, setup
 from chaskey._version import __version__
 
 setup(
-    version=__version__
+    version=__version__,
+    ext_modules=[
+        # Optional: the pure python implementation is used if this fails to build
+        Extension('chaskey._native', sources=['chaskey/_native.c'], optional=True),
+    ],
 )
\ No newline at end of file
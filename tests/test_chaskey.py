@@ -0,0 +1,141 @@
+"""Tests for the Chaskey-LTS cipher and its CTR backends."""
+
+import os
+
+import pytest
+
+from chaskey import Chaskey
+from chaskey import chaskey as chaskey_module
+
+# Block test vector from the Donut loader's Chaskey-LTS implementation
+KAT_KEY = bytes.fromhex('5609e9685f58e32940ecec98c522982f')
+KAT_PLAINTEXT = bytes.fromhex('b8232826fd5e405e69a301a978ea7ad8')
+KAT_CIPHERTEXT = bytes.fromhex('d5608d4da2bf347babf8772fdfedde07')
+
+# CTR outputs for bytes(range(40)) from the original implementation
+KAT_CTR = [
+    (KAT_PLAINTEXT,
+     'd5618f4ea6ba327ca3f17d24d3e0d00800b5ea95fa862c470b3a6b56873963fc'
+     '93e998967860c5ad'),
+    (bytes.fromhex('000102030405060708090a0bfffffffe'),
+     '507afcaa52212d0382e80ba006df6794fd0549da3eef52ae51a34d5659704a64'
+     '2e4f463257d40445'),
+]
+
+COUNTERS = [
+    bytes.fromhex('0f1e2d3c4b5a69788796a5b4c3d2e1f0'),
+    # Carry out of the last byte
+    bytes.fromhex('000102030405060708090a0b0c0d0ef0'),
+    # Carry out of the low 32-bit word
+    bytes.fromhex('000102030405060708090a0bfffffff0'),
+    # Carry across 64 bits
+    bytes.fromhex('0001020304050607fffffffffffffff0'),
+    # Wrap at 2**128
+    bytes.fromhex('fffffffffffffffffffffffffffffff0'),
+]
+
+BACKENDS = ['python', 'vec', 'jit', 'native']
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    """Force CTR mode through a single backend."""
+    name = request.param
+    native = jit = vec = None
+    if name == 'native':
+        native = pytest.importorskip('chaskey._native')
+    elif name == 'jit':
+        jit = pytest.importorskip('chaskey._jit')
+    elif name == 'vec':
+        vec = pytest.importorskip('chaskey._vec')
+        monkeypatch.setattr(chaskey_module, '_VECTOR_THRESHOLD', 0)
+    monkeypatch.setattr(chaskey_module, '_native', native)
+    monkeypatch.setattr(chaskey_module, '_jit', jit)
+    monkeypatch.setattr(chaskey_module, '_vec', vec)
+    return name
+
+
+def _python_ctr(key, nonce, data):
+    # Reference output from the pure python implementation
+    native, jit, vec = (chaskey_module._native, chaskey_module._jit,
+                        chaskey_module._vec)
+    chaskey_module._native = chaskey_module._jit = chaskey_module._vec = None
+    try:
+        return bytes(Chaskey('ctr', key, nonce).encrypt(data))
+    finally:
+        chaskey_module._native = native
+        chaskey_module._jit = jit
+        chaskey_module._vec = vec
+
+
+def test_block_known_answer():
+    c = Chaskey('ctr', KAT_KEY, bytes(16))
+    assert c._chaskey_block(True, KAT_PLAINTEXT) == KAT_CIPHERTEXT
+    assert c._chaskey_block(False, KAT_CIPHERTEXT) == KAT_PLAINTEXT
+
+
+def test_ctr_known_answer(backend):
+    # A zero block under a counter equal to the plaintext is its ciphertext
+    c = Chaskey('ctr', KAT_KEY, KAT_PLAINTEXT)
+    assert bytes(c.encrypt(bytes(16))) == KAT_CIPHERTEXT
+
+    for nonce, expected in KAT_CTR:
+        c = Chaskey('ctr', KAT_KEY, nonce)
+        assert bytes(c.encrypt(bytes(range(40)))) == bytes.fromhex(expected)
+
+
+@pytest.mark.parametrize('nonce', COUNTERS, ids=lambda n: n[-4:].hex())
+def test_ctr_matches_python(backend, nonce):
+    key = bytes(range(1, 17))
+    data = os.urandom(300)
+    for length in range(0, 301):
+        expected = _python_ctr(key, nonce, data[:length])
+        out = Chaskey('ctr', key, nonce).encrypt(data[:length])
+        assert isinstance(out, bytearray)
+        assert bytes(out) == expected, length
+
+
+def test_ctr_large_buffer(backend):
+    # Large enough for the numba parallel kernel and many SIMD groups
+    key = os.urandom(16)
+    nonce = COUNTERS[2]
+    data = os.urandom(70000)
+    c = Chaskey('ctr', key, nonce)
+    assert bytes(c.encrypt(data)) == _python_ctr(key, nonce, data)
+
+
+def test_ctr_unaligned_input(backend):
+    key = os.urandom(16)
+    nonce = COUNTERS[0]
+    raw = os.urandom(1001)
+    data = memoryview(raw)[1:]
+    c = Chaskey('ctr', key, nonce)
+    assert bytes(c.encrypt(data)) == _python_ctr(key, nonce, bytes(data))
+
+
+def test_ctr_counter_wraps():
+    key = os.urandom(16)
+    high = Chaskey('ctr', key, b'\xff' * 16).encrypt(bytes(32))
+    zero = Chaskey('ctr', key, bytes(16)).encrypt(bytes(16))
+    assert high[16:] == zero
+
+
+def test_ctr_round_trip(backend):
+    key = os.urandom(16)
+    nonce = bytearray(os.urandom(16))
+    data = os.urandom(1000)
+    c = Chaskey('ctr', key, nonce)
+    assert bytes(c.decrypt(c.encrypt(data))) == data
+    assert c.counter == nonce
+
+
+@pytest.mark.parametrize('key', [bytes(15), bytes(17)])
+def test_rejects_bad_key_length(key):
+    with pytest.raises(ValueError):
+        Chaskey('ctr', key, bytes(16))
+
+
+@pytest.mark.parametrize('nonce', [bytes(8), bytes(15), bytes(17)])
+def test_rejects_bad_nonce_length(nonce):
+    with pytest.raises(ValueError):
+        Chaskey('ctr', bytes(16), nonce)